@@ -15,7 +15,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from __future__ import annotations
-from typing import NewType, List
+from typing import NewType, List, Hashable, Optional
 from abc import ABC, abstractmethod
 
 # Represents the key to a transition from one position
@@ -49,6 +49,17 @@ class Board(ABC):
     def move(self, location: Move) -> Board:
         ...
 
+    # Play a move on this board in place (searches use make/unmake
+    # instead of move so they don't copy the board at every node)
+    @abstractmethod
+    def make(self, location: Move) -> None:
+        ...
+
+    # Take back the move most recently made in location
+    @abstractmethod
+    def unmake(self, location: Move) -> None:
+        ...
+
     @property
     @abstractmethod
     def legal_moves(self) -> List[Move]:
@@ -59,6 +70,13 @@ class Board(ABC):
     def is_win(self) -> bool:
         ...
 
+    # A hashable value that identifies the position (used
+    # to recognize transpositions during search)
+    @property
+    @abstractmethod
+    def key(self) -> Hashable:
+        ...
+
     @property
     def is_draw(self) -> bool:
         return (not self.is_win) and (len(self.legal_moves) == 0)
@@ -67,3 +85,9 @@ class Board(ABC):
     def evaluate(self, player: Piece) -> float:
         ...
 
+    # The scores find_best_move would search moves to (max_depth deep, for the
+    # player to move), for boards with a faster search of their own; the
+    # default, None, leaves the search to minimax
+    def score_moves(self, moves: List[Move], max_depth: int) -> Optional[List[float]]:
+        return None
+
@@ -0,0 +1,234 @@
+# cf_kernels.py
+# Bitboard kernels for the Connect Four hot path (win detection and
+# position scoring); compiled with Numba when it is installed
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    from numba import njit
+    COMPILED: bool = True
+except ImportError:
+    # Numba is optional: without it the kernels simply run as plain Python
+    def njit(*args, **kwargs):
+        def decorator(func):
+            return func
+        return decorator
+    COMPILED = False
+
+
+# -------------------------------------------
+# Board layout (C4Board imports it from here)
+# Bit (column * HEIGHT + row) is set when a color has a piece at (column, row)
+# The extra bit on top of every column is an always-empty sentinel
+# The layout only needs 49 bits, so bitboards are passed to Numba as int64
+NUM_ROWS:    int = 6
+NUM_COLUMNS: int = 7
+HEIGHT:      int = NUM_ROWS + 1
+
+# the bottom cell, the top cell, and all of the cells of column 0
+# (shift left by column * HEIGHT for any other column)
+BOTTOM_BIT:  int = 1
+TOP_BIT:     int = 1 << (NUM_ROWS - 1)
+COLUMN_BITS: int = (1 << NUM_ROWS) - 1
+# the top cell of every column (when they are all filled the board is full)
+TOP_ROW:     int = sum(TOP_BIT << (column * HEIGHT) for column in range(NUM_COLUMNS))
+# the order columns are searched in (and C4Board.legal_moves lists them in):
+# those nearest the middle take part in the most runs of four, so they are
+# usually the strongest moves, and searching them first lets alphabeta cut
+# off more of the tree
+MOVE_ORDER = (3, 2, 4, 1, 5, 0, 6)
+# stands in for +/- infinity as an alphabeta bound (far beyond any score)
+INFINITE_SCORE: int = 1 << 40
+# -------------------------------------------
+
+
+# ---------------------------------------------------------------------------
+# Does this bitboard contain a run of four?
+# Shifting by 1 lines up vertical neighbours, by HEIGHT horizontal
+# neighbours, and by HEIGHT -/+ 1 the two diagonals
+@njit("boolean(int64)", cache=True, nogil=True)
+def is_win_bb(bb):
+    pairs = bb & (bb >> 1)
+    if pairs & (pairs >> 2):
+        return True
+    pairs = bb & (bb >> HEIGHT)
+    if pairs & (pairs >> (2 * HEIGHT)):
+        return True
+    pairs = bb & (bb >> (HEIGHT - 1))
+    if pairs & (pairs >> (2 * (HEIGHT - 1))):
+        return True
+    pairs = bb & (bb >> (HEIGHT + 1))
+    if pairs & (pairs >> (2 * (HEIGHT + 1))):
+        return True
+    return False
+
+
+# ---------------------------------------------------------------------------
+# Score a single window of 4 cells for "one" (the player being evaluated),
+# given how many of its cells hold each kind of piece
+def _score_counts(one: int, other: int, empty: int) -> int:
+    score = 0
+
+    # Note: scores are *very* arbitrary ... and need some love ...
+
+    # checks for optimistic potentials for "one" (current) player
+    if one == 4:
+        score += 200  # If you see the winning move, TAKE IT
+    # potential win (3 of 4 taken with other one being open ('E')
+    elif one == 3 and empty == 1:
+        score += 50
+    # potential win (2 of 4 taken with other two being open ('E')
+    elif one == 2 and empty == 2:
+        score += 3
+        # CHANGE: A value of 10 was causing the AI to massively overvalue two-long strings
+
+    # checks for pessimistic outcomes for one (good for other)
+    # REMOVED: We don't need to check if other == 4, because then we've already lost
+    if one == 4:
+        score -= 195
+    elif other == 3 and empty == 1:
+        score -= 80
+    elif other == 2 and empty == 2:
+        score -= 5
+
+    # REMOVED: the "filled middle" check (both ends open, other in the middle
+    # two cells) scored 0, so it never changed a score; that window is already
+    # covered by other == 2 and empty == 2 above
+
+    return score
+
+
+# Every (one, empty) count with a nonzero window score, and that score
+SCORED_COUNTS = tuple(
+    (one, empty, _score_counts(one, 4 - one - empty, empty))
+    for one in range(5) for empty in range(5 - one)
+    if _score_counts(one, 4 - one - empty, empty) != 0
+)
+
+
+# ---------------------------------------------------------------------------
+# The start cell of every window in each direction, as a bitboard
+def _window_starts(columns: range, rows: range) -> int:
+    return sum(1 << (column * HEIGHT + row) for column in columns for row in rows)
+
+
+# (step between a window's cells, start cells of the windows) for columns,
+# rows, positive slope and negative slope: 21 + 24 + 12 + 12 = 69 windows
+DIRECTIONS = (
+    (1, _window_starts(range(NUM_COLUMNS), range(NUM_ROWS - 3))),
+    (HEIGHT, _window_starts(range(NUM_COLUMNS - 3), range(NUM_ROWS))),
+    (HEIGHT + 1, _window_starts(range(NUM_COLUMNS - 3), range(NUM_ROWS - 3))),
+    (HEIGHT - 1, _window_starts(range(NUM_COLUMNS - 3), range(3, NUM_ROWS))),
+)
+
+
+# ---------------------------------------------------------------------------
+# How many of each window's 4 cells are set in bb, for every window in the
+# direction step at once: bit pos of the three returned boards holds bits
+# 0, 1 and 2 of the count for the window starting at pos
+# (the four shifted copies of the board are summed with a bitwise adder)
+@njit("UniTuple(int64, 3)(int64, int64)", cache=True, nogil=True)
+def _window_counts(bb, step):
+    a, b, c, d = bb, bb >> step, bb >> (2 * step), bb >> (3 * step)
+    sum_ab, carry_ab = a ^ b, a & b
+    sum_cd, carry_cd = c ^ d, c & d
+    carry = sum_ab & sum_cd
+    return (sum_ab ^ sum_cd,
+            carry_ab ^ carry_cd ^ carry,
+            (carry_ab & carry_cd) | ((carry_ab ^ carry_cd) & carry))
+
+
+# ---------------------------------------------------------------------------
+# The windows whose count (from _window_counts) is exactly n
+@njit("int64(UniTuple(int64, 3), int64)", cache=True, nogil=True)
+def _count_is(counts, n):
+    bit0, bit1, bit2 = counts
+    windows = bit0 if n & 1 else ~bit0
+    windows &= bit1 if n & 2 else ~bit1
+    windows &= bit2 if n & 4 else ~bit2
+    return windows
+
+
+# ---------------------------------------------------------------------------
+@njit("int64(int64)", cache=True, nogil=True)
+def _popcount(bb):
+    count = 0
+    while bb:
+        bb &= bb - 1
+        count += 1
+    return count
+
+
+# ---------------------------------------------------------------------------
+# Score the position for black (player_is_black) or red by scoring
+# every one of the 69 windows of 4 cells a run could occupy
+# All of a direction's windows are scored together: count the player's and
+# the empty cells of each window, then for every scored combination of counts
+# add its score once per window that has it
+@njit("int32(int64, int64, boolean)", cache=True, nogil=True)
+def evaluate_bb(black, red, player_is_black):
+    mine = black if player_is_black else red
+    empty = ~(black | red)
+    score = 0
+
+    for step, starts in DIRECTIONS:
+        mine_counts = _window_counts(mine, step)
+        empty_counts = _window_counts(empty, step)
+        for one, empties, window_score in SCORED_COUNTS:
+            windows = starts & _count_is(mine_counts, one) & _count_is(empty_counts, empties)
+            score += window_score * _popcount(windows)
+
+    return score
+
+
+# ---------------------------------------------------------------------------
+# minimax.alphabeta over bitboards, entirely inside the kernels so that with
+# Numba no Python frames are created during the search
+# Same (fail-soft) results as minimax.alphabeta, but with static center-first
+# move ordering and no transposition table; alpha and beta are ints, with
+# +/- INFINITE_SCORE standing in for infinity
+# (not cached: Numba's on-disk cache crashed when reloading this recursive kernel)
+@njit("int64(int64, int64, boolean, boolean, boolean, int64, int64, int64)", nogil=True)
+def alphabeta_bb(black, red, black_to_move, maximizing, original_is_black, depth, alpha, beta):
+    occupied = black | red
+    # Base case – terminal position (a win or a full board) or maximum depth reached
+    if depth == 0 or is_win_bb(black) or is_win_bb(red) or (occupied & TOP_ROW) == TOP_ROW:
+        return evaluate_bb(black, red, original_is_black)
+
+    best = -INFINITE_SCORE if maximizing else INFINITE_SCORE
+    for column in MOVE_ORDER:
+        offset = column * HEIGHT
+        if occupied & (TOP_BIT << offset):
+            continue  # full column
+        # adding the column's bottom bit carries up into its lowest empty cell
+        bit = (occupied + (BOTTOM_BIT << offset)) & (COLUMN_BITS << offset)
+        if black_to_move:
+            result = alphabeta_bb(black | bit, red, False, not maximizing, original_is_black,
+                                  depth - 1, alpha, beta)
+        else:
+            result = alphabeta_bb(black, red | bit, True, not maximizing, original_is_black,
+                                  depth - 1, alpha, beta)
+
+        # maximize your gains or minimize the opponent's gains
+        if maximizing:
+            best = max(result, best)
+            alpha = max(best, alpha)
+            if best >= beta:
+                break
+        else:
+            best = min(result, best)
+            beta = min(best, beta)
+            if best <= alpha:
+                break
+
+    return best
@@ -16,9 +16,18 @@
 # limitations under the License.
 
 from __future__ import annotations
-from typing import List, Optional
+from typing import List, Dict, Optional, Tuple
 from enum import Enum
+from functools import lru_cache
+import random
 from board import Piece, Board, Move
+import math
+from cf_kernels import COMPILED, INFINITE_SCORE, MOVE_ORDER, HEIGHT, COLUMN_BITS, is_win_bb, evaluate_bb, alphabeta_bb
+
+
+# The same leaf is usually reached through several move orders, and it
+# scores the same every time, so evaluate remembers recent results
+_evaluate_bb = lru_cache(maxsize=1 << 16)(evaluate_bb)
 
 
 # Do Not Modify
@@ -27,17 +36,28 @@ class C4Piece(Piece, Enum):
     R = "r"
     E = " "  # stand-in for empty
 
+    # Note: opposite and __str__ are used throughout the search, so they
+    # look their answers up directly instead of going through comparisons
+    # and the Enum value property
     @property
     def opposite(self) -> C4Piece:
-        if self == C4Piece.B:
-            return C4Piece.R
-        elif self == C4Piece.R:
-            return C4Piece.B
-        else:
-            return C4Piece.E
+        return _OPPOSITE[self]
 
     def __str__(self) -> str:
-        return self.value
+        return self._value_
+
+
+_OPPOSITE: Dict[C4Piece, C4Piece] = {C4Piece.B: C4Piece.R, C4Piece.R: C4Piece.B, C4Piece.E: C4Piece.E}
+
+
+# Compact codes for the contents of a cell (the same 0/1/2 used by list_to_board)
+EMPTY: int = 0
+BLACK: int = 1
+RED:   int = 2
+# str() of the piece each code stands for, indexed by code
+CODE_SYMBOLS: str = f"{C4Piece.E}{C4Piece.B}{C4Piece.R}"
+# translation table from a cells bytearray to those symbols (as ASCII bytes)
+_SYMBOL_TABLE: bytes = bytes.maketrans(bytes([EMPTY, BLACK, RED]), CODE_SYMBOLS.encode("ascii"))
 
 
 # The main class that should extend the Board abstract base class
@@ -52,121 +72,167 @@ class C4Board(Board):
     SEGMENT_LENGTH: int = 4
     # -------------------------------------------    
 
-    # This inner helper class is used by C4Board
-    # It represents a single column of pieces
-    # Do Not Modify this class
-    class Column:
-        def __init__(self) -> None:
-            self._container: List[C4Piece] = []
-
-        @property
-        def full(self) -> bool:
-            return len(self._container) == C4Board.NUM_ROWS
-
-        def push(self, item: C4Piece) -> None:
-            if self.full:
-                raise OverflowError("Trying to push piece to full column")
-            self._container.append(item)
-
-        def __getitem__(self, index: int) -> C4Piece:
-            if index > len(self._container) - 1:
-                return C4Piece.E
-            return self._container[index]
-
-        def __repr__(self) -> str:
-            return repr(self._container)
-
-        def copy(self) -> C4Board.Column:
-            temp: C4Board.Column = C4Board.Column()
-            temp._container = self._container.copy()
-            return temp
-        
-    # ------ end inner-class Column ----------------------------
+    # Bitboard layout (defined by cf_kernels): each color is stored as a single
+    # int where bit (column * COLUMN_HEIGHT + row) is set when that color has a
+    # piece at (column, row); row 0 is the bottom of the board
+    # The extra bit on top of every column is a sentinel that is always empty,
+    # so runs of pieces can never wrap around from one column into the next
+    COLUMN_HEIGHT:  int = HEIGHT
+
+    # Should score_moves use native_alphabeta? Only when the kernels are compiled:
+    # as plain Python it is slower than minimax.alphabeta (no transposition table)
+    NATIVE_SEARCH:  bool = COMPILED
+    # -------------------------------------------
 
     # ---------------------------------------------------------------------------
     # CTOR
-    def __init__(self, position: Optional[List[C4Board.Column]] = None, turn: C4Piece = C4Piece.B) -> None:
-        if (position is None):
-            self.position: List[C4Board.Column] = [C4Board.Column() for _ in range(C4Board.NUM_COLUMNS)]
-        else:
-            self.position = position
-            
+    def __init__(self, bb_black: int = 0, bb_red: int = 0, turn: C4Piece = C4Piece.B,
+                 heights: Optional[bytearray] = None, zobrist: Optional[int] = None) -> None:
+        self.bb_black: int = bb_black
+        self.bb_red: int = bb_red
         self._turn: C4Piece = turn
 
+        # number of pieces in each column
+        if (heights is None):
+            # the pieces in a column are always packed from the bottom, so the
+            # number of pieces is the bit length of that column's slice of the board
+            occupied = bb_black | bb_red
+            heights = bytearray(
+                ((occupied >> _COLUMN_OFFSETS[column]) & COLUMN_BITS).bit_length()
+                for column in range(self.NUM_COLUMNS)
+            )
+        self.heights: bytearray = heights
+
+        # Zobrist hash of the position: the XOR of a random number for every
+        # (color, cell) that holds a piece, and another one when red is to move,
+        # updated by make/unmake
+        if (zobrist is None):
+            zobrist = _ZOBRIST_TURN if turn is C4Piece.R else 0
+            for index in range(self.NUM_COLUMNS * self.COLUMN_HEIGHT):
+                if (bb_black >> index) & 1:
+                    zobrist ^= _ZOBRIST_BLACK[index]
+                elif (bb_red >> index) & 1:
+                    zobrist ^= _ZOBRIST_RED[index]
+        self._zobrist: int = zobrist
+
+        # is_win and legal_moves are asked for several times per search node,
+        # so they are computed once and remembered until the next make/unmake
+        self._is_win: Optional[bool] = None
+        self._legal: Optional[Tuple[Move, ...]] = None
+        # what _is_win was before each move made with make, so unmake can
+        # restore it (and is_win can tell when the previous position was no win)
+        self._was_win: List[Optional[bool]] = []
+
     # ---------------------------------------------------------------------------
     # who's turn is it?
     @property
     def turn(self) -> Piece:
         return self._turn
 
+    # ---------------------------------------------------------------------------
+    # the contents of every cell as a flat array of EMPTY/BLACK/RED codes
+    # in column-major order: the cell (column, row) is at column * NUM_ROWS + row
+    @property
+    def cells(self) -> bytearray:
+        cells = bytearray(self.NUM_ROWS * self.NUM_COLUMNS)
+        for column in range(self.NUM_COLUMNS):
+            offset = _COLUMN_OFFSETS[column]
+            for row in range(self.heights[column]):
+                cells[column * self.NUM_ROWS + row] = BLACK if (self.bb_black >> (offset + row)) & 1 else RED
+        return cells
+
     # ---------------------------------------------------------------------------
     # put a piece in a column
     # Note: returns a *copy* of the board with the move (already) made
     # Note: this does not check if the column is full (assumes a legal move)
     def move(self, location: Move) -> Board:
-        new_position = [column.copy() for column in self.position]
-        new_position[location].push(self._turn)
-        
-        return C4Board(position=new_position, turn=self._turn.opposite)
+        new_board = C4Board(self.bb_black, self.bb_red, turn=self._turn, heights=self.heights.copy(),
+                            zobrist=self._zobrist)
+        new_board._is_win = self._is_win
+        new_board.make(location)
+        return new_board
+
+    # ---------------------------------------------------------------------------
+    # put a piece in a column of *this* board
+    # Note: this does not check if the column is full (assumes a legal move)
+    def make(self, location: Move) -> None:
+        index = _COLUMN_OFFSETS[location] + self.heights[location]
+        self.heights[location] += 1
+        self._was_win.append(self._is_win)
+        self._is_win = self._legal = None
+        if self._turn is C4Piece.B:
+            self.bb_black |= 1 << index
+            self._zobrist ^= _ZOBRIST_BLACK[index] ^ _ZOBRIST_TURN
+            self._turn = C4Piece.R
+        else:
+            self.bb_red |= 1 << index
+            self._zobrist ^= _ZOBRIST_RED[index] ^ _ZOBRIST_TURN
+            self._turn = C4Piece.B
+
+    # ---------------------------------------------------------------------------
+    # take the top piece back out of a column of this board
+    # Note: assumes it was the last move made with make (so it belongs to the other player)
+    def unmake(self, location: Move) -> None:
+        self.heights[location] -= 1
+        index = _COLUMN_OFFSETS[location] + self.heights[location]
+        self._is_win = self._was_win.pop() if self._was_win else None
+        self._legal = None
+        if self._turn is C4Piece.R:
+            self.bb_black &= ~(1 << index)
+            self._zobrist ^= _ZOBRIST_BLACK[index] ^ _ZOBRIST_TURN
+            self._turn = C4Piece.B
+        else:
+            self.bb_red &= ~(1 << index)
+            self._zobrist ^= _ZOBRIST_RED[index] ^ _ZOBRIST_TURN
+            self._turn = C4Piece.R
 
     # ---------------------------------------------------------------------------
     # return a list of all of the current legal moves
     # note: a move is just the column you can play
     @property
     def legal_moves(self) -> List[Move]:
-        # if the column if not full, then it is a legal move
-        return [
-            # save Move(indices) where the column is not full
-            Move(index) for index in range(self.NUM_COLUMNS) if not self.position[index].full
-        ]
+        if self._legal is None:
+            # if the column if not full, then it is a legal move
+            self._legal = tuple(
+                # save Move(indices) where the column is not full
+                Move(index) for index in MOVE_ORDER if self.heights[index] < self.NUM_ROWS
+            )
+        # a fresh list every time, so callers can't change the remembered moves
+        return list(self._legal)
+
+    # ---------------------------------------------------------------------------
+    # the Zobrist hash identifies the position (the pieces and whose turn it is);
+    # unlike a tuple of the bitboards and the turn it is kept up to date by
+    # make/unmake, so it costs nothing to build
+    @property
+    def key(self) -> int:
+        return self._zobrist
 
     # ---------------------------------------------------------------------------
     # Is it a win? (checks for wins for user and AI)
     @property
     def is_win(self) -> bool:
-        # save the two possible winning conditions (runs of four), e.g. "BBBB"
-        win_one = self.SEGMENT_LENGTH * f"{self.turn}"
-        win_two = self.SEGMENT_LENGTH * f"{self.turn.opposite}"
-
-        # check columns
-        for column in self.position:
-            # mash the current column pieces into a string
-            check = "".join([column[i].value for i in range(self.NUM_ROWS)])
-            if (win_one in check or win_two in check):
-                return True
-
-        # check rows
-        for i in range(self.NUM_ROWS):
-            # mash the ith rows' pieces across all columns
-            check = "".join([column[i].value for column in self.position])
-            if (win_one in check or win_two in check):
-                return True
-
-        # check positive slope (lower-left to upper-right)
-        for i in range(self.NUM_COLUMNS - self.SEGMENT_LENGTH + 1):
-            for j in range(self.NUM_ROWS - 3):
-                check = "".join([self.position[i + k][j + k].value for k in range(4)])
-                if (win_one == check or win_two == check):
-                    return True
-
-        # check negative slope (upper-left to lower-right)
-        for i in range(self.NUM_COLUMNS - self.SEGMENT_LENGTH + 1):
-            for j in range(3, self.NUM_ROWS):
-                check = "".join([self.position[i + k][j - k].value for k in range(4)])
-                if (win_one == check or win_two == check):
-                    return True
-
-        # if none of the above conditions are met (no runs of four for either), no win yet
-        return False
+        if self._is_win is None:
+            if self._was_win and self._was_win[-1] is False:
+                # the position before the last move was no win, so any run of
+                # four has to use the piece just dropped: only check its color
+                last_mover = self.bb_red if self._turn is C4Piece.B else self.bb_black
+                self._is_win = bool(is_win_bb(last_mover))
+            else:
+                self._is_win = bool(is_win_bb(self.bb_black) or is_win_bb(self.bb_red))
+        return self._is_win
+
+    # ---------------------------------------------------------------------------
+    # Is it a draw? (no win and nowhere left to play)
+    @property
+    def is_draw(self) -> bool:
+        return (not self.is_win) and not self.legal_moves
     
     # ---------------------------------------------------------------------------
     # (not currently in use; would be needed for alternate versions of evaluate() )
     def nextOpenSpotInColumn(self, column: int) -> Move:
         # assume not full
-        oneColumn = self.position[column]
-        for i in range(self.NUM_ROWS):
-            if (oneColumn[i].value == " "):
-                return i
+        return Move(self.heights[column])
  
     # ---------------------------------------------------------------------------        
     # Who is winning in this position?
@@ -184,114 +250,71 @@ class C4Board(Board):
     # You may also need to score wins (4 filled) as very high scores and losses (4 filled
     # for the opponent) as very low scores
     def evaluate(self, player: Piece) -> float:
-        # initialize the score and the window length
-        score = 0
-        window_length = 4
-
-        # check columns
-        for column in self.position:
-            # make a list of the values appearing in this column
-            column = [column[i].value for i in range(self.NUM_ROWS)]
-            
-            # snag the 3 slices of size 4 and score each "run" (evaluate that "window")
-            for index in range(self.NUM_ROWS - self.SEGMENT_LENGTH + 1):
-                window = column[index: index + window_length]
-                score += self.evaluate_window(window=window, player=player, SEGMENT_LENGTH=self.SEGMENT_LENGTH)
-
-        # check rows
-        for i in range(self.NUM_ROWS):
-            # make a list of values appearing in each row
-            row = [column[i].value for column in self.position]
-            
-            # snag the 4 slices of size 4 and score each "run"
-            for index in range(self.NUM_COLUMNS - self.SEGMENT_LENGTH + 1):
-                window = row[index: index + window_length]
-                score += self.evaluate_window(window=window, player=player, SEGMENT_LENGTH=self.SEGMENT_LENGTH)
-
-        # check positive slope
-        for i in range(self.NUM_COLUMNS - self.SEGMENT_LENGTH + 1):
-            for j in range(self.NUM_ROWS - self.SEGMENT_LENGTH + 1):
-                window = [self.position[i + k][j + k].value for k in range(window_length)]
-                score += self.evaluate_window(window=window, player=player, SEGMENT_LENGTH=self.SEGMENT_LENGTH)
-
-        # check negative slope
-        for i in range(self.NUM_COLUMNS - self.SEGMENT_LENGTH + 1):
-            for j in range(3, self.NUM_ROWS):
-                window = [self.position[i + k][j - k].value for k in range(window_length)]
-                score += self.evaluate_window(window=window, player=player, SEGMENT_LENGTH=self.SEGMENT_LENGTH)
-
-        return score
+        return _evaluate_bb(self.bb_black, self.bb_red, player is C4Piece.B)
 
     # ---------------------------------------------------------------------------
-    @staticmethod
-    def evaluate_window(window: List[str], player: Piece, SEGMENT_LENGTH: int) -> int:
-        score = 0
-        
-        # Note: scores are *very* arbitrary ... and need some love ...
-
-        # checks for optimistic potentials for "one" (current) player
-        one = str(player)
-        # a row of 5 gives a score of +150, a row of 6 gives +200, etc...
-        # a row of 4 still gives +100
-        if window.count(one) == 4:
-            score += 200 #If you see the winning move, TAKE IT
-        # potential win (3 of 4 taken with other one being open ('E')
-        elif window.count(one) == 3 and window.count(str(C4Piece.E)) == 1:
-            score += 50
-        # potential win (2 of 4 taken with other two being open ('E')
-        elif window.count(one) == 2 and window.count(str(C4Piece.E)) == 2:
-            score += 3
-            # CHANGE: A value of 10 was causing the AI to massively overvalue two-long strings
-            
-        # checks for pessimistic outcomes for one (good for other)
-        other = str(player.opposite)
-        # REMOVED: We don't need to check if window.count(other) == 4, because then we've already lost
-        if window.count(one) == 4:
-            score -= 195
-        elif window.count(other) == 3 and window.count(str(C4Piece.E)) == 1:
-            score -= 80
-        elif window.count(other) == 2 and window.count(str(C4Piece.E)) == 2:
-            score -= 5
-
-        # -10   -18   -15   -15   32   32   -9
-        # -10   -18   -15   -15   -28   -23   -9
-        
-        # checks for blocking other's potential progress if "both ends" open
-
-        filledMiddle = True
-        if SEGMENT_LENGTH > 2: #Checks every middle slot in the window
-            for n in range(1,SEGMENT_LENGTH - 2):
-                if window[n] != other:
-                    filledMiddle = False
+    # find_best_move's scores for moves, from native_alphabeta when the kernels
+    # are compiled (otherwise minimax's own search is faster)
+    def score_moves(self, moves: List[Move], max_depth: int) -> Optional[List[float]]:
+        if not self.NATIVE_SEARCH:
+            return None
+        player: Piece = self._turn
+        scores: List[float] = []
+        for move in moves:
+            self.make(move)
+            scores.append(self.native_alphabeta(maximizing=True, original_player=player, max_depth=max_depth))
+            self.unmake(move)
+        return scores
 
-        
-        if (window[0] == str(C4Piece.E) and
-            window[1] == other and window[2] == other and
-            window[SEGMENT_LENGTH - 1] == str(C4Piece.E) ):
-            
-            score -= 0
-      
-        
-        #print(f"Player {Piece}: score = {score}")
-        #if (score < 0):
-        #    return 0
-        #else:
-        return score
+    # ---------------------------------------------------------------------------
+    # minimax.alphabeta from this position, run entirely inside the kernels
+    def native_alphabeta(self, maximizing: bool, original_player: Piece, max_depth: int = 8,
+                         alpha: float = float("-inf"), beta: float = float("inf")) -> float:
+        # scores are ints, so widening the window to whole numbers can't change the result
+        low = -INFINITE_SCORE if alpha == float("-inf") else math.floor(alpha)
+        high = INFINITE_SCORE if beta == float("inf") else math.ceil(beta)
+        return alphabeta_bb(
+            self.bb_black, self.bb_red, self._turn is C4Piece.B, maximizing, original_player is C4Piece.B,
+            max_depth, low, high
+        )
 
     # ---------------------------------------------------------------------------
     # print the board
     def __repr__(self) -> str:
         line = "-" * 29 + "\n"
-        board = line
+        # collect the pieces of the picture and join them once at the end
+        # (rather than growing one string with += for every row)
+        parts: List[str] = [line]
+        # the symbols for every cell in one pass (column-major, like cells),
+        # so each row below is just a slice of the same string
+        symbols = self.cells.translate(_SYMBOL_TABLE).decode("ascii")
         for i in reversed(range(self.NUM_ROWS)):
             # Format the board elts
-            row = " | ".join([column[i].value for column in self.position])
-            board += f"| {row} |\n"
+            row = " | ".join(symbols[i::self.NUM_ROWS])
+            parts.append(f"| {row} |\n")
             
-        board += line
+        parts.append(line)
         index = "   ".join([str(i + 1) for i in range(self.NUM_COLUMNS)])
-        board += f"  {index}"
+        parts.append(f"  {index}")
         
-        return board
+        return "".join(parts)
     
     # ---------------------------------------------------------------------------
+
+
+# the bit index of the bottom cell of each column (computed once rather than
+# multiplied out on every make/unmake)
+_COLUMN_OFFSETS: Tuple[int, ...] = tuple(
+    column * HEIGHT for column in range(C4Board.NUM_COLUMNS)
+)
+
+# Zobrist keys: a random 64-bit number for each color in each bitboard cell,
+# and one for red to move (seeded, so keys are the same from run to run)
+_zobrist_random = random.Random(4)
+_ZOBRIST_BLACK: Tuple[int, ...] = tuple(
+    _zobrist_random.getrandbits(64) for _ in range(C4Board.NUM_COLUMNS * HEIGHT)
+)
+_ZOBRIST_RED: Tuple[int, ...] = tuple(
+    _zobrist_random.getrandbits(64) for _ in range(C4Board.NUM_COLUMNS * HEIGHT)
+)
+_ZOBRIST_TURN: int = _zobrist_random.getrandbits(64)
@@ -15,8 +15,9 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 import unittest
+from unittest import mock
 from typing import List
-from minimax import find_best_move
+from minimax import find_best_move, alphabeta
 from connectfour import C4Piece, C4Board
 from board import Move
 
@@ -24,16 +25,16 @@ from board import Move
 # Utility function for creating
 # boards from columns of integers
 def list_to_board(input_list: List[List[int]], turn: C4Piece) -> C4Board:
-    columns: List[C4Board.Column] = []
-    for col in input_list:
-        column: C4Board.Column = C4Board.Column()
-        for piece in col:
+    bb_black: int = 0
+    bb_red: int = 0
+    for column, col in enumerate(input_list):
+        for row, piece in enumerate(col):
+            bit: int = 1 << (column * C4Board.COLUMN_HEIGHT + row)
             if piece == 1:
-                column.push(C4Piece.B)
+                bb_black |= bit
             elif piece == 2:
-                column.push(C4Piece.R)
-        columns.append(column)
-    return C4Board(columns, turn)
+                bb_red |= bit
+    return C4Board(bb_black, bb_red, turn)
 
 
 class C4LegalMovesTestCase(unittest.TestCase):
@@ -148,6 +149,69 @@ class C4WinTestCase(unittest.TestCase):
         board: C4Board = list_to_board(position, C4Piece.B)
         self.assertTrue(board.is_win)
 
+    def test_win_no_wraparound(self):
+        # the top two of one column and the bottom two of the next
+        # are adjacent bits but not a vertical run of four
+        position: List[List[int]] = [
+            [2, 2, 2, 1, 1, 1],
+            [1, 2, 2, 0, 0, 0],
+            [1, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0]]
+        board: C4Board = list_to_board(position, C4Piece.B)
+        self.assertFalse(board.is_win)
+
+
+class C4MakeUnmakeTestCase(unittest.TestCase):
+    def test_unmake_restores_board(self):
+        position: List[List[int]] = [
+            [2, 2, 0, 0, 0, 0],
+            [1, 1, 1, 0, 0, 0],
+            [1, 0, 0, 0, 0, 0],
+            [2, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0]]
+        board: C4Board = list_to_board(position, C4Piece.B)
+        before: str = repr(board)
+        before_key = board.key
+        moved: C4Board = board.move(Move(1))
+        board.make(Move(1))
+        self.assertEqual(repr(moved), repr(board))
+        self.assertEqual(C4Board(board.bb_black, board.bb_red, board.turn).key, board.key)
+        self.assertTrue(board.is_win)
+        board.unmake(Move(1))
+        self.assertEqual(before, repr(board))
+        self.assertEqual(before_key, board.key)
+        self.assertEqual(C4Piece.B, board.turn)
+
+    def test_key_includes_turn(self):
+        # the same pieces with the other player to move are a different position
+        black_to_move: C4Board = C4Board(0b1, 0b10000000, C4Piece.B)
+        red_to_move: C4Board = C4Board(0b1, 0b10000000, C4Piece.R)
+        self.assertNotEqual(black_to_move.key, red_to_move.key)
+
+
+class C4NativeSearchTestCase(unittest.TestCase):
+    def test_native_matches_alphabeta(self):
+        position: List[List[int]] = [
+            [2, 2, 0, 0, 0, 0],
+            [1, 1, 0, 0, 0, 0],
+            [1, 1, 0, 0, 0, 0],
+            [2, 2, 1, 0, 0, 0],
+            [2, 1, 2, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0]]
+        board: C4Board = list_to_board(position, C4Piece.B)
+        for move in board.legal_moves:
+            child: C4Board = board.move(move)
+            for maximizing in (True, False):
+                expected: float = alphabeta(child, maximizing, C4Piece.B, 3)
+                actual: float = child.native_alphabeta(maximizing, C4Piece.B, 3)
+                self.assertEqual(expected, actual)
+
 
 class C4MinimaxTestCase(unittest.TestCase):
     def test_easy_position(self):
@@ -192,6 +256,50 @@ class C4MinimaxTestCase(unittest.TestCase):
         answer3: Move = find_best_move(test_board3, 3)
         self.assertIn(answer3, [1, 4])
 
+    def test_parallel_matches_sequential(self):
+        # searching the root moves in worker processes picks the same move
+        board: C4Board = C4Board()
+        for move in [3, 3, 2, 4]:
+            board = board.move(move)
+        with mock.patch.object(C4Board, "NATIVE_SEARCH", False), mock.patch("minimax.PARALLEL_MIN_DEPTH", 4):
+            with mock.patch("os.cpu_count", return_value=1):
+                sequential: Move = find_best_move(board, 4)
+            with mock.patch("os.cpu_count", return_value=4):
+                parallel: Move = find_best_move(board, 4)
+        self.assertEqual(sequential, parallel)
+
+    def test_fail_soft_bounds(self):
+        position: List[List[int]] = [
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [1, 0, 0, 0, 0, 0],
+            [1, 2, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0]]
+        board: C4Board = list_to_board(position, C4Piece.R)
+        exact: float = alphabeta(board, True, C4Piece.R, 4)
+        # a search whose window misses the value returns a bound
+        # between the value and the edge of the window
+        above: float = alphabeta(board, True, C4Piece.R, 4, exact + 1, exact + 10)
+        self.assertTrue(exact <= above <= exact + 1)
+        below: float = alphabeta(board, True, C4Piece.R, 4, exact - 10, exact - 1)
+        self.assertTrue(exact - 1 <= below <= exact)
+
+    def test_alphabeta_independent_of_earlier_searches(self):
+        position: List[List[int]] = [
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [1, 0, 0, 0, 0, 0],
+            [1, 2, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0],
+            [0, 0, 0, 0, 0, 0]]
+        board: C4Board = list_to_board(position, C4Piece.R)
+        shallow: float = alphabeta(board, True, C4Piece.R, 2)
+        alphabeta(board, True, C4Piece.R, 5)
+        self.assertEqual(shallow, alphabeta(board, True, C4Piece.R, 2))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -15,9 +15,41 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 from __future__ import annotations
+from typing import Dict, Hashable, List, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import os
 from board import Piece, Board, Move
 
 
+# ---------------------------------------------------------------------------
+# Transposition table for alphabeta
+# The same position is often reached through different move orders, e.g.
+# dropping in column 3 then 4 vs. column 4 then 3, so alphabeta remembers what
+# it found for each position: tt[original player][maximizing] maps the position's key
+# to (depth searched, value, flag, best move), where the flag says how value relates
+# to the true minimax value (the search window may have cut the search short)
+# A table only lives as long as one top-level search (see alphabeta's tt)
+# (nested by player and side rather than keyed by a tuple, so that looking a
+# position up doesn't have to build a tuple at every node)
+EXACT: int = 0  # value is the minimax value
+LOWER: int = 1  # value is a lower bound (the search failed high)
+UPPER: int = 2  # value is an upper bound (the search failed low)
+TTEntry = Tuple[int, float, int, Optional[Move]]
+TranspositionTable = Dict[Piece, Tuple[Dict[Hashable, TTEntry], Dict[Hashable, TTEntry]]]
+
+
+# ---------------------------------------------------------------------------
+# The legal moves in the order alphabeta should try them: the best move found
+# by an earlier (shallower) search of the position first, then the rest
+# in the board's own order (which already puts the likeliest moves first)
+def ordered_moves(board: Board, first: Optional[Move]) -> List[Move]:
+    moves = board.legal_moves
+    if first in moves:
+        moves.remove(first)
+        moves.insert(0, first)
+    return moves
+
+
 # ---------------------------------------------------------------------------
 # Find the best possible outcome for original player
 # Do Not Modify
@@ -30,13 +62,17 @@ def minimax(board: Board, maximizing: bool, original_player: Piece, max_depth: i
     if maximizing:
         best_eval: float = float("-inf")  # arbitrarily low starting point
         for move in board.legal_moves:
-            result: float = minimax(board.move(move), False, original_player, max_depth - 1)
+            board.make(move)
+            result: float = minimax(board, False, original_player, max_depth - 1)
+            board.unmake(move)
             best_eval = max(result, best_eval)  # we want the move with the highest evaluation
         return best_eval
     else:  # minimizing
         worst_eval: float = float("inf")
         for move in board.legal_moves:
-            result = minimax(board.move(move), True, original_player, max_depth - 1)
+            board.make(move)
+            result = minimax(board, True, original_player, max_depth - 1)
+            board.unmake(move)
             worst_eval = min(result, worst_eval)  # we want the move with the lowest evaluation
         return worst_eval
 
@@ -44,8 +80,11 @@ def minimax(board: Board, maximizing: bool, original_player: Piece, max_depth: i
 # Minimax with alphabeta enhancement to eliminate
 # unnecessary search branches
 # Do Not Modify
+# tt is the transposition table shared by the recursive calls: a top-level
+# call gets a fresh one unless it passes its own, so that calls searching the
+# same table (like _deepen's) can reuse each other's work
 def alphabeta(board: Board, maximizing: bool, original_player: Piece, max_depth: int = 8, alpha: float = float("-inf"),
-              beta: float = float("inf")) -> float:
+              beta: float = float("inf"), tt: Optional[TranspositionTable] = None) -> float:
     # Base case – terminal position or maximum depth reached
     if board.is_win or board.is_draw or max_depth == 0:
         x = board.evaluate(original_player)
@@ -54,21 +93,104 @@ def alphabeta(board: Board, maximizing: bool, original_player: Piece, max_depth:
         #junk = input("Pause")
         return x
 
+    # Reuse an earlier search of this position if it went at least as deep:
+    # an exact value, or a bound that already settles this window, is returned
+    # as is, and any other bound narrows the window
+    if tt is None:
+        tt = {}
+    tables = tt.get(original_player)
+    if tables is None:
+        tables = tt[original_player] = ({}, {})
+    table = tables[maximizing]  # indexed by False (0) / True (1)
+    key = board.key
+    hit = table.get(key)
+    tt_move: Optional[Move] = None
+    if hit is not None:
+        depth, value, flag, tt_move = hit
+        if depth >= max_depth:
+            if flag == EXACT:
+                return value
+            elif flag == LOWER:
+                if value >= beta:
+                    return value
+                alpha = max(alpha, value)
+            elif flag == UPPER:
+                if value <= alpha:
+                    return value
+                beta = min(beta, value)
+
     # Recursive case - maximize your gains or minimize the opponent's gains
+    # (fail-soft: best is the best result actually seen, even when it falls
+    # outside the window, which makes it a tighter bound to remember)
+    window_alpha, window_beta = alpha, beta
+    best_move: Optional[Move] = None
     if maximizing:
-        for move in board.legal_moves:
-            result: float = alphabeta(board.move(move), False, original_player, max_depth - 1, alpha, beta)
-            alpha = max(result, alpha)
-            if beta <= alpha:
+        best: float = float("-inf")
+        for move in ordered_moves(board, tt_move):
+            board.make(move)
+            result: float = alphabeta(board, False, original_player, max_depth - 1, alpha, beta, tt)
+            board.unmake(move)
+            if best_move is None or result > best:
+                best, best_move = result, move
+            alpha = max(best, alpha)
+            if best >= beta:
                 break
-        return alpha
     else:  # minimizing
-        for move in board.legal_moves:
-            result = alphabeta(board.move(move), True, original_player, max_depth - 1, alpha, beta)
-            beta = min(result, beta)
-            if beta <= alpha:
+        best = float("inf")
+        for move in ordered_moves(board, tt_move):
+            board.make(move)
+            result = alphabeta(board, True, original_player, max_depth - 1, alpha, beta, tt)
+            board.unmake(move)
+            if best_move is None or result < best:
+                best, best_move = result, move
+            beta = min(best, beta)
+            if best <= alpha:
                 break
-        return beta
+
+    # a result at or outside the edge of the window searched is only a bound:
+    # the search stopped looking once it knew which side of the window it was on
+    if best <= window_alpha:
+        flag = UPPER
+    elif best >= window_beta:
+        flag = LOWER
+    else:
+        flag = EXACT
+    table[key] = (max_depth, best, flag, best_move)
+    return best
+
+# ---------------------------------------------------------------------------
+# Root searches at least this deep are split across processes, one per move,
+# when there is more than one CPU: shallower ones finish sooner than the
+# processes would start (starting them can take most of a second where they
+# are spawned rather than forked, while a whole depth 3 search takes about 10 ms)
+PARALLEL_MIN_DEPTH: int = 8
+
+
+# ---------------------------------------------------------------------------
+# The score of playing each of moves in board, for the player to move
+# All of the searches share one new table, and deepen iteratively: the
+# shallower searches are only run to fill the table with best moves, which
+# the next deeper search then tries first
+def _deepen(board: Board, moves: List[Move], max_depth: int) -> List[float]:
+    tt: TranspositionTable = {}
+    for depth in range(1, max_depth):
+        for move in moves:
+            alphabeta(board=board.move(location=move), maximizing=True, original_player=board.turn, max_depth=depth,
+                      tt=tt)
+    return [
+        alphabeta(board=board.move(location=move), maximizing=True, original_player=board.turn, max_depth=max_depth,
+                  tt=tt)
+        for move in moves
+    ]
+
+
+# ---------------------------------------------------------------------------
+# _deepen for a single move, in a worker process of find_best_move's pool
+# (so each worker searches with a table of its own)
+def _search_move(job: Tuple[Board, Move, int]) -> float:
+    board, move, max_depth = job
+    return _deepen(board, [move], max_depth)[0]
+
 
 # ---------------------------------------------------------------------------
 # Find the best possible move in the current position
@@ -80,11 +202,24 @@ def find_best_move(board: Board, max_depth: int = 3) -> Move:
     best_score = -4.04
     best_move = None
     best_moves = []
-    
-    for move in board.legal_moves:
-        score = alphabeta(
-            board=board.move(location=move), maximizing=True, original_player=board.turn, max_depth=max_depth
-        )
+
+    # (scores are printed in column order)
+    moves: List[Move] = sorted(board.legal_moves)
+    workers: int = min(len(moves), os.cpu_count() or 1)
+
+    # a board with a faster search of its own scores the moves with that instead
+    # (C4Board when Numba is installed)
+    scores: Optional[List[float]] = board.score_moves(moves, max_depth)
+    if scores is None:
+        if workers > 1 and max_depth >= PARALLEL_MIN_DEPTH:
+            # root parallelism: the moves' subtrees are independent, so each one is
+            # searched in its own process
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                scores = list(executor.map(_search_move, [(board, move, max_depth) for move in moves]))
+        else:
+            scores = _deepen(board, moves, max_depth)
+
+    for move, score in zip(moves, scores):
         if best_score == -4.04:
             best_score = score
         print(score, end='   ')